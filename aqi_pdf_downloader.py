@@ -1,10 +1,29 @@
 import os
-import requests
+import json
+import errno
+import asyncio
+import threading
+import aiohttp
 from datetime import datetime, timedelta
 import logging
 from pathlib import Path
 from tqdm import tqdm
 
+try:
+    import fcntl
+except ImportError:
+    # No POSIX locks on Windows; downloads are then only deduplicated within
+    # one process, which is all the standalone CLI needs
+    fcntl = None
+
+# Bulletins are a few hundred KiB, so most arrive in one or two chunks
+CHUNK_SIZE = 256 * 1024
+
+# Transient server errors and dropped connections are retried with backoff
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = {502, 503, 504}
+
 class AQIBulletinDownloader:
     """Downloads AQI bulletins from CPCB website for a specified date range."""
     
@@ -17,8 +36,206 @@ class AQIBulletinDownloader:
         """
         self.base_url = "https://cpcb.nic.in/upload/Downloads"
         self.output_dir = Path(output_dir)
+        self.max_concurrency = 16
         self.setup_logging()
         
+        # Dates known to have no bulletin, so reruns don't probe them again
+        self.missing_path = self.output_dir / "missing.json"
+        self.missing = self.load_missing()
+        self.missing_lock = threading.Lock()
+        self._missing_changes = set()
+        
+        # ETag/Last-Modified of interrupted downloads, so they can resume
+        self.validators_path = self.output_dir / "validators.json"
+        self.validators = self.load_validators()
+        self.validators_lock = threading.Lock()
+        self._validator_changes = {}
+        
+        # Serializes state file writes within this process, also where there
+        # is no fcntl to lock them across processes
+        self.state_lock = threading.Lock()
+        
+        # aiohttp sessions are bound to one event loop, so all downloads run
+        # on a long-lived loop thread that keeps its connection pool and DNS
+        # cache across calls from any thread
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+        self._aiohttp_session = None
+        self._sem = None
+        self._inflight = {}
+        self._download_lock = None
+    
+    def load_missing(self):
+        """Load the set of dates known to have no bulletin"""
+        try:
+            with open(self.missing_path) as file:
+                return set(json.load(file))
+        except (FileNotFoundError, ValueError):
+            return set()
+    
+    def update_state_file(self, path, update):
+        """
+        Read-modify-write a JSON state file shared with other processes
+        
+        Each gunicorn worker has its own downloader, so the file is merged
+        under an exclusive lock rather than overwritten from one process's
+        copy, and replaced atomically so readers never see a partial write.
+        
+        Args:
+            path (Path): JSON file to update
+            update (callable): Takes the current contents (None if absent)
+                and returns the new contents
+            
+        Returns:
+            The new contents
+        """
+        self.create_output_directory()
+        with self.state_lock, open(self.output_dir / ".state.lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(path) as file:
+                    current = json.load(file)
+            except (FileNotFoundError, ValueError):
+                current = None
+            new = update(current)
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, 'w') as file:
+                json.dump(new, file)
+            os.replace(tmp_path, path)
+        return new
+    
+    def save_missing(self):
+        """Persist the dates newly known to have no bulletin, if any"""
+        with self.missing_lock:
+            changes = self._missing_changes
+            self._missing_changes = set()
+        if not changes:
+            return
+        merged = self.update_state_file(
+            self.missing_path,
+            lambda current: sorted(set(current or []) | changes)
+        )
+        with self.missing_lock:
+            self.missing.update(merged)
+    
+    def mark_missing(self, date):
+        """
+        Record that the server has no bulletin for a date
+        
+        Recent dates are not recorded since their bulletin may not be
+        published yet.
+        
+        Args:
+            date (datetime): Date that returned 404
+        """
+        if (datetime.now() - date).days <= 2:
+            return
+        date_str = date.strftime("%Y%m%d")
+        with self.missing_lock:
+            self.missing.add(date_str)
+            self._missing_changes.add(date_str)
+    
+    def load_validators(self):
+        """Load the ETag/Last-Modified recorded for partial downloads"""
+        try:
+            with open(self.validators_path) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+    
+    def save_validators(self):
+        """Persist changes to the ETag/Last-Modified of partial downloads, if any"""
+        def apply(merged, changes):
+            for date_str, validator in changes.items():
+                if validator is None:
+                    merged.pop(date_str, None)
+                else:
+                    merged[date_str] = validator
+            return merged
+        
+        with self.validators_lock:
+            # Only this process's own changes are applied on top of the file
+            changes = self._validator_changes
+            self._validator_changes = {}
+        if not changes:
+            return
+        merged = self.update_state_file(
+            self.validators_path,
+            lambda current: apply(current or {}, changes)
+        )
+        with self.validators_lock:
+            # Keep changes made while the file was being written
+            self.validators = apply(merged, self._validator_changes)
+    
+    def remember_validators(self, date_str, headers):
+        """
+        Record the validators of a full response so an interrupted download
+        of it can be resumed
+        
+        Args:
+            date_str (str): Date in YYYYMMDD format
+            headers (Mapping): Response headers
+        """
+        validator = headers.get('ETag') or headers.get('Last-Modified')
+        with self.validators_lock:
+            if validator:
+                self.validators[date_str] = validator
+            else:
+                self.validators.pop(date_str, None)
+            self._validator_changes[date_str] = validator
+    
+    def forget_validators(self, date_str):
+        """Drop the validators of a download that has completed"""
+        with self.validators_lock:
+            self.validators.pop(date_str, None)
+            self._validator_changes[date_str] = None
+    
+    def resume_headers(self, date_str, part_path):
+        """
+        Build request headers that resume a partial download
+        
+        The Range is sent with If-Range, so the server only returns the
+        remaining bytes when the bulletin hasn't changed and sends it in
+        full otherwise.
+        
+        Args:
+            date_str (str): Date in YYYYMMDD format
+            part_path (Path): Partial download on disk
+            
+        Returns:
+            tuple: (headers, offset) where offset is the size already on disk
+        """
+        validator = self.validators.get(date_str)
+        try:
+            offset = part_path.stat().st_size
+        except FileNotFoundError:
+            offset = 0
+        if not validator or not offset:
+            return {}, 0
+        return {'Range': f'bytes={offset}-', 'If-Range': validator}, offset
+    
+    def close(self):
+        """Close the HTTP session and stop the download loop"""
+        if self._loop is not None:
+            if self._aiohttp_session is not None:
+                asyncio.run_coroutine_threadsafe(self._aiohttp_session.close(), self._loop).result()
+                self._aiohttp_session = None
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+            self._loop = None
+        if self._download_lock is not None:
+            self._download_lock.close()
+            self._download_lock = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        
     def setup_logging(self):
         """Configure logging for the downloader"""
         logging.basicConfig(
@@ -53,12 +270,8 @@ class AQIBulletinDownloader:
             if end_date < start_date:
                 raise ValueError("End date must be after start date")
                 
-            date_list = []
-            current_date = start_date
-            while current_date <= end_date:
-                date_list.append(current_date)
-                current_date += timedelta(days=1)
-            return date_list
+            num_days = (end_date - start_date).days + 1
+            return [start_date + timedelta(days=i) for i in range(num_days)]
             
         except ValueError as e:
             self.logger.error(f"Date format error: {e}")
@@ -74,26 +287,41 @@ class AQIBulletinDownloader:
         Returns:
             bool: True if download successful, False otherwise
         """
-        date_str = date.strftime("%Y%m%d")
-        filename = f"AQI_Bulletin_{date_str}.pdf"
-        url = f"{self.base_url}/{filename}"
-        output_path = self.output_dir / filename
+        self.create_output_directory()
+        return self._run(self._download_all([date]))[0]
+    
+    async def _fetch_attempt(self, session, sem, date, url, part_path):
+        """
+        Make one request for a bulletin and write its body to part_path
         
-        if output_path.exists():
-            self.logger.info(f"File already exists: {filename}")
-            return True
+        Args:
+            session (aiohttp.ClientSession): Session shared by all downloads
+            sem (asyncio.Semaphore): Bounds the number of in-flight downloads
+            date (datetime): Date to download bulletin for
+            url (str): Bulletin URL
+            part_path (Path): Partial download, resumed when possible
+            
+        Returns:
+            bool: True if part_path now holds the whole bulletin, False if it
+            isn't available, None if the server error is worth retrying
+        """
+        date_str = date.strftime("%Y%m%d")
+        filename = url.rsplit("/", 1)[-1]
+        headers, offset = self.resume_headers(date_str, part_path)
         
-        try:
-            # Try first URL pattern
-            response = requests.get(url)
+        async with sem, session.get(url, headers=headers) as response:
+            if response.status in RETRY_STATUSES:
+                return None
             
-            # If first pattern fails, try alternate URL pattern
-            if response.status_code != 200:
-                alternate_url = f"{self.base_url}/AQI_Bulletin_{date_str}.pdf"
-                response = requests.get(alternate_url)
-                if response.status_code != 200:
-                    self.logger.warning(f"Bulletin not found for date: {date_str}")
-                    return False
+            if response.status not in (200, 206):
+                if response.status == 416:
+                    # The partial file doesn't fit the bulletin, start over next time
+                    part_path.unlink(missing_ok=True)
+                    self.forget_validators(date_str)
+                if response.status == 404:
+                    self.mark_missing(date)
+                self.logger.warning(f"Bulletin not found for date: {date_str}")
+                return False
             
             # Verify PDF content type
             content_type = response.headers.get('content-type', '').lower()
@@ -101,28 +329,204 @@ class AQIBulletinDownloader:
                 self.logger.warning(f"Not a PDF file for date: {date_str}")
                 return False
             
-            total_size = int(response.headers.get('content-length', 0))
+            if response.status == 200:
+                # Full body, either a fresh download or the bulletin changed
+                offset = 0
+                self.remember_validators(date_str, response.headers)
+            else:
+                self.logger.info(f"Resuming {filename} from byte {offset}")
             
-            with open(output_path, 'wb') as file, tqdm(
-                desc=filename,
-                total=total_size,
-                unit='iB',
-                unit_scale=True,
-                unit_divisor=1024,
-            ) as pbar:
-                for data in response.iter_content(chunk_size=1024):
-                    size = file.write(data)
-                    pbar.update(size)
+            with open(part_path, 'ab' if offset else 'wb') as file:
+                while True:
+                    data = await response.content.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    await asyncio.to_thread(file.write, data)
+        
+        return True
+    
+    async def _fetch_one(self, session, sem, date):
+        """
+        Download AQI bulletin for a specific date within a shared aiohttp session
+        
+        Args:
+            session (aiohttp.ClientSession): Session shared by all downloads
+            sem (asyncio.Semaphore): Bounds the number of in-flight downloads
+            date (datetime): Date to download bulletin for
             
-            self.logger.info(f"Successfully downloaded: {filename}")
-            return True
+        Returns:
+            bool: True if download successful, False otherwise
+        """
+        date_str = date.strftime("%Y%m%d")
+        filename = f"AQI_Bulletin_{date_str}.pdf"
+        url = f"{self.base_url}/{filename}"
+        output_path = self.output_dir / filename
+        # Written under a temporary name so a partial file is never mistaken
+        # for a complete bulletin, and kept on failure so it can be resumed
+        part_path = output_path.with_name(filename + ".part")
+        
+        try:
+            if output_path.exists():
+                self.logger.info(f"File already exists: {filename}")
+                return True
             
-        except requests.exceptions.RequestException as e:
+            if date_str in self.missing:
+                self.logger.info(f"Bulletin known to be missing for date: {date_str}")
+                return False
+            
+            # Other worker processes may fetch the same date; only the holder
+            # of the date's lock writes the partial file and publishes it
+            await self._lock_date(date_str)
+            try:
+                if output_path.exists():
+                    self.logger.info(f"File downloaded by another worker: {filename}")
+                    return True
+                
+                return await self._fetch_locked(session, sem, date, url, part_path, output_path)
+            finally:
+                self._unlock_date(date_str)
+            
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            # The partial file is kept and resumed on the next run
             self.logger.error(f"Failed to download {filename}: {e}")
-            if output_path.exists():
-                output_path.unlink()
             return False
     
+    async def _lock_date(self, date_str):
+        """
+        Wait for this process to hold the cross-process lock on a date
+        
+        Downloads within this process are already deduplicated by
+        _download_one, so per-process POSIX record locks on one byte of a
+        shared lock file are enough. Without fcntl this does nothing.
+        
+        Args:
+            date_str (str): Date in YYYYMMDD format
+        """
+        if fcntl is None:
+            return
+        if self._download_lock is None:
+            self._download_lock = open(self.output_dir / ".download.lock", 'a')
+        while True:
+            try:
+                fcntl.lockf(self._download_lock, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, int(date_str))
+                return
+            except OSError as e:
+                if e.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+                await asyncio.sleep(0.2)
+    
+    def _unlock_date(self, date_str):
+        """Release the lock taken by _lock_date"""
+        if fcntl is None:
+            return
+        fcntl.lockf(self._download_lock, fcntl.LOCK_UN, 1, int(date_str))
+    
+    async def _fetch_locked(self, session, sem, date, url, part_path, output_path):
+        """
+        Download a bulletin with retries while holding its lock file
+        
+        Args:
+            session (aiohttp.ClientSession): Session shared by all downloads
+            sem (asyncio.Semaphore): Bounds the number of in-flight downloads
+            date (datetime): Date to download bulletin for
+            url (str): Bulletin URL
+            part_path (Path): Partial download, resumed when possible
+            output_path (Path): Final location of the bulletin
+            
+        Returns:
+            bool: True if download successful, False otherwise
+        """
+        date_str = date.strftime("%Y%m%d")
+        filename = output_path.name
+        
+        result = None
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                result = await self._fetch_attempt(session, sem, date, url, part_path)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                    asyncio.TimeoutError) as e:
+                # Whatever arrived stays in the partial file and is resumed
+                if attempt == MAX_RETRIES:
+                    raise
+                self.logger.warning(f"Retrying {filename} after error: {e}")
+                continue
+            if result is not None:
+                break
+            self.logger.warning(f"Server error for {filename}")
+        
+        if not result:
+            return False
+        
+        part_path.replace(output_path)
+        self.forget_validators(date_str)
+        self.logger.info(f"Successfully downloaded: {filename}")
+        return True
+    
+    async def _download_one(self, session, sem, date, pbar):
+        """
+        Download AQI bulletin for a date, sharing the download with any
+        concurrent range that asked for the same date
+        
+        Args:
+            session (aiohttp.ClientSession): Session shared by all downloads
+            sem (asyncio.Semaphore): Bounds the number of in-flight downloads
+            date (datetime): Date to download bulletin for
+            pbar (tqdm): Overall progress bar, advanced once per date
+            
+        Returns:
+            bool: True if download successful, False otherwise
+        """
+        date_str = date.strftime("%Y%m%d")
+        task = self._inflight.get(date_str)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_one(session, sem, date))
+            self._inflight[date_str] = task
+            task.add_done_callback(lambda _: self._inflight.pop(date_str, None))
+        try:
+            return await asyncio.shield(task)
+        finally:
+            pbar.update(1)
+    
+    async def _download_all(self, dates):
+        """
+        Download bulletins for all dates concurrently
+        
+        Args:
+            dates (list): List of datetime objects
+            
+        Returns:
+            list: One bool per date, True if the download succeeded
+        """
+        if self._aiohttp_session is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300)
+            timeout = aiohttp.ClientTimeout(sock_connect=5, sock_read=30)
+            self._aiohttp_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        
+        try:
+            with tqdm(total=len(dates), desc="Overall Progress") as pbar:
+                return await asyncio.gather(
+                    *[self._download_one(self._aiohttp_session, self._sem, date, pbar) for date in dates]
+                )
+        finally:
+            # Written from a worker thread so the flock and file I/O don't
+            # stall other downloads running on this loop
+            await asyncio.to_thread(self.save_missing)
+            await asyncio.to_thread(self.save_validators)
+    
+    def _run(self, coro):
+        """Run a coroutine on the downloader's event loop thread and wait for it"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="aqi-download-loop", daemon=True
+                )
+                self._loop_thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
     def download_range(self, start_date, end_date):
         """
         Download bulletins for a date range
@@ -137,16 +541,11 @@ class AQIBulletinDownloader:
         self.create_output_directory()
         dates = self.get_date_range(start_date, end_date)
         
-        successful = 0
-        failed = 0
-        
         self.logger.info(f"Starting download for date range: {start_date} to {end_date}")
         
-        for date in tqdm(dates, desc="Overall Progress"):
-            if self.download_bulletin(date):
-                successful += 1
-            else:
-                failed += 1
+        results = self._run(self._download_all(dates))
+        successful = sum(results)
+        failed = len(results) - successful
         
         return successful, failed
 
@@ -165,8 +564,8 @@ def main():
         output_dir = input("Enter output directory (default: aqi_bulletins): ").strip() or "aqi_bulletins"
         
         # Initialize and run downloader
-        downloader = AQIBulletinDownloader(output_dir)
-        successful, failed = downloader.download_range(start_date, end_date)
+        with AQIBulletinDownloader(output_dir) as downloader:
+            successful, failed = downloader.download_range(start_date, end_date)
         
         print(f"\nDownload Summary:")
         print(f"Successful downloads: {successful}")
@@ -1,19 +1,255 @@
 # Save as "extract_aqi.py"
 
 import os
+import json
+import sqlite3
+import multiprocessing
+import threading
 from pathlib import Path
-import PyPDF2
+import pypdfium2 as pdfium
 import re
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
 import openpyxl
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill, Font, Alignment
 
+# Below this many PDFs, parse in-process rather than starting a worker pool
+PARALLEL_MIN_PDFS = 4
+
+# Processes in the extraction pool; gunicorn.conf.py sets AQI_POOL_WORKERS so
+# the pools of all its workers together use each CPU once
+POOL_WORKERS = int(os.environ.get('AQI_POOL_WORKERS') or os.cpu_count() or 1)
+
+# PDFium isn't thread-safe, so in-process calls into it are serialized
+_PDFIUM_LOCK = threading.Lock()
+
+# One pool per process, shared by all requests and started on first use.
+# Its workers come from a forkserver where there is one, so they aren't
+# forked from a process with live request threads; Windows only has spawn.
+_POOL = None
+_POOL_LOCK = threading.Lock()
+_POOL_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+)
+
+# Bulletins up to this size are read in one call and parsed from memory
+MAX_IN_MEMORY_PDF = 10 * 1024 * 1024
+
+# Bump whenever extraction output changes so cached results are discarded
+CACHE_VERSION = 3
+
+# Compiled once at import rather than looked up in re's cache on every call
+_INDEX_RE = re.compile(r'\b(\d{2,3})\b')
+_ROW_INDEX_RE = re.compile(r'\s*(\d{1,3})\b(?!\.\d)')
+_POLL_RE = re.compile(r'PM2\.5|PM10|O3|NO2|SO2|CO')
+_POLL_MAP = {
+    'PM2.5': 'PM₂.₅',
+    'PM10': 'PM₁₀',
+    'O3': 'O₃',
+    'NO2': 'NO₂',
+    'SO2': 'SO₂',
+    'CO': 'CO'
+}
+
+@lru_cache(maxsize=None)
+def _category_re(categories):
+    """
+    Compile one alternation over all AQI categories
+
+    Longer names go first so 'Very Poor' wins over 'Poor', and the leftmost
+    match is the category closest to the city name.
+    """
+    ordered = sorted(categories, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(category) for category in ordered))
+
+def _find_pollutants(text):
+    """Return the pollutants named in text, in the fixed _POLL_MAP order"""
+    # Remove spaces for better matching, then one pass over the text
+    found = set(_POLL_RE.findall(text.replace(' ', '')))
+    return [name for key, name in _POLL_MAP.items() if key in found]
+
+def _parse_row(rest, aqi_colors):
+    """
+    Parse a bulletin table row laid out on a single line
+
+    Bulletin rows read 'S.No City Air-Quality Index Pollutants ...'. Only the
+    text after the city name is passed in, so the serial number can't be
+    mistaken for the index and the index is the number right after the
+    category. Returns None when the line isn't a complete row.
+    """
+    match = _category_re(tuple(aqi_colors)).search(rest)
+    if not match:
+        return None
+    # The index must directly follow the category, otherwise it's not a row
+    index_match = _ROW_INDEX_RE.match(rest, match.end())
+    if not index_match or int(index_match.group(1)) > 500:
+        return None
+
+    category = match.group()
+    data = {
+        'Air_Quality': category,
+        'Color': aqi_colors[category],
+        'Index_Value': index_match.group(1)
+    }
+    pollutants = _find_pollutants(rest[index_match.end():])
+    if pollutants:
+        data['Prominent_Pollutant'] = ', '.join(pollutants)
+    return data
+
+def _find_data_in_text(text, text_lower, city_lower, aqi_colors):
+    """
+    Extract AQI data from text using pattern matching
+
+    text_lower and city_lower are computed once by the caller so the page
+    isn't lowercased again for every city.
+    """
+    try:
+        # Jump between occurrences of the city instead of walking every line
+        idx = text_lower.find(city_lower)
+        while idx != -1:
+            line_start = text.rfind('\n', 0, idx) + 1
+            line_end = text.find('\n', idx)
+            if line_end == -1:
+                line_end = len(text)
+            city_idx = idx
+            # Next search starts on the following line, one hit per line
+            idx = text_lower.find(city_lower, line_end)
+
+            # Tabular rows usually come out on one line, parse the rest of the
+            # city's line directly
+            data = _parse_row(text[city_idx + len(city_lower):line_end], aqi_colors)
+            if data:
+                print(f"Found complete row: {data}")
+                return data
+
+            # Get a few lines after for context (up to 3 lines)
+            window_end = line_end
+            for _ in range(3):
+                if window_end >= len(text):
+                    break
+                window_end = text.find('\n', window_end + 1)
+                if window_end == -1:
+                    window_end = len(text)
+
+            # Combine lines for searching
+            search_text = ' '.join(line.strip() for line in text[line_start:window_end].split('\n'))
+            print(f"\nAnalyzing text: {search_text}")
+
+            # Extract Air Quality; without one the window can't be a match, so
+            # skip the remaining scans
+            match = _category_re(tuple(aqi_colors)).search(search_text)
+            if not match:
+                continue
+            category = match.group()
+            print(f"Found Air Quality: {category}")
+
+            # Extract Index Value (look for 2-3 digit number)
+            values = (m.group(1) for m in _INDEX_RE.finditer(search_text))
+            value = next((v for v in values if 50 <= int(v) <= 500), None)
+            if value is None:
+                continue
+            print(f"Found Index Value: {value}")
+
+            data = {
+                'Air_Quality': category,
+                'Color': aqi_colors[category],
+                'Index_Value': value
+            }
+
+            # Extract Pollutants with improved pattern matching
+            pollutants = _find_pollutants(search_text)
+
+            # Combine found pollutants
+            if pollutants:
+                data['Prominent_Pollutant'] = ', '.join(pollutants)
+                print(f"Found Pollutants: {data['Prominent_Pollutant']}")
+
+            print(f"Found complete data: {data}")
+            return data
+
+        return None
+    except Exception as e:
+        print(f"Error extracting data: {e}")
+        return None
+
+def _get_pool():
+    """Return this process's extraction pool, starting it if needed"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=_POOL_CONTEXT)
+        return _POOL
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next batch starts a fresh one"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False)
+
+def _process_pdf_multi(pdf_path, cities, aqi_colors):
+    """
+    Process a single PDF file for several cities, extracting its text once
+
+    Returns a dict of city to data (None where the city wasn't found), or None
+    if the PDF couldn't be read, so the failure isn't cached as 'no data'.
+    """
+    results = dict.fromkeys(cities)
+    try:
+        # A single read() instead of PDFium's many small reads; larger files
+        # are left to PDFium so they aren't held in memory twice
+        path = os.fspath(pdf_path)
+        with open(path, 'rb') as file:
+            source = file.read(MAX_IN_MEMORY_PDF + 1)
+        if len(source) > MAX_IN_MEMORY_PDF:
+            source = path
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(source)
+            page_count = len(pdf)
+        try:
+            city_lowers = {city: city.lower() for city in cities}
+            page_texts = []
+            page_lowers = []
+            for i in range(page_count):
+                with _PDFIUM_LOCK:
+                    page = pdf[i]
+                    textpage = page.get_textpage()
+                    page_texts.append(textpage.get_text_range())
+                    textpage.close()
+                    page.close()
+                page_lowers.append(page_texts[-1].lower())
+
+                # Scan this page together with the previous one so a row
+                # wrapped over the page break is still seen
+                text = '\n'.join(page_texts[-2:])
+                text_lower = '\n'.join(page_lowers[-2:])
+                for city, city_lower in city_lowers.items():
+                    if results[city] is None and city_lower in text_lower:
+                        results[city] = _find_data_in_text(text, text_lower, city_lower, aqi_colors)
+
+                # Stop extracting pages once every city is resolved
+                if all(data is not None for data in results.values()):
+                    break
+        finally:
+            with _PDFIUM_LOCK:
+                pdf.close()
+    except FileNotFoundError:
+        print(f"File not found: {pdf_path}")
+        return None
+    except Exception as e:
+        print(f"Error processing PDF: {e}")
+        return None
+    return results
+
 class AQIDataExtractor:
     def __init__(self, pdf_dir):
         self.pdf_dir = Path(pdf_dir)
-        if not self.pdf_dir.exists():
-            self.pdf_dir.mkdir(parents=True, exist_ok=True)
+        self.pdf_dir.mkdir(parents=True, exist_ok=True)
         
         self.aqi_colors = {
             'Good': '00FF00',
@@ -24,122 +260,159 @@ class AQIDataExtractor:
             'Severe': '800080'
         }
 
+        # Text color readable on each category's background, computed once
+        self.aqi_font = {}
+        for color in self.aqi_colors.values():
+            rgb = int(color, 16)
+            brightness = (((rgb >> 16) & 255) * 299 + 
+                        ((rgb >> 8) & 255) * 587 + 
+                        (rgb & 255) * 114) / 1000
+            self.aqi_font[color] = '000000' if brightness > 128 else 'FFFFFF'
+
+        # Extraction results keyed by PDF mtime/size, so unchanged bulletins
+        # are never parsed twice
+        # The connection may be shared by request threads, so every use of it
+        # holds cache_lock
+        self.cache = sqlite3.connect(self.pdf_dir / '.aqi_cache.sqlite', check_same_thread=False)
+        self.cache_lock = threading.Lock()
+        if self.cache.execute('PRAGMA user_version').fetchone()[0] != CACHE_VERSION:
+            self.cache.execute('DROP TABLE IF EXISTS extracted')
+            self.cache.execute(f'PRAGMA user_version = {CACHE_VERSION}')
+        self.cache.execute(
+            'CREATE TABLE IF NOT EXISTS extracted ('
+            'path TEXT, city TEXT, mtime INT, size INT, data TEXT, '
+            'PRIMARY KEY (path, city))'
+        )
+        self.cache.commit()
+
+    def cache_get(self, pdf_path, city, st):
+        """Return (hit, data) for a PDF whose stat result is st"""
+        with self.cache_lock:
+            row = self.cache.execute(
+                'SELECT data FROM extracted WHERE path = ? AND city = ? AND mtime = ? AND size = ?',
+                (pdf_path.name, city.lower(), st.st_mtime_ns, st.st_size)
+            ).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0])
+
+    def cache_put(self, pdf_path, city, st, data):
+        """Store the extraction result for a PDF whose stat result is st"""
+        self.cache_put_many([(pdf_path, city, st, data)])
+
+    def cache_put_many(self, entries):
+        """Store (pdf_path, city, st, data) extraction results in one transaction"""
+        with self.cache_lock:
+            self.cache.executemany(
+                'INSERT OR REPLACE INTO extracted VALUES (?, ?, ?, ?, ?)',
+                [(pdf_path.name, city.lower(), st.st_mtime_ns, st.st_size, json.dumps(data))
+                 for pdf_path, city, st, data in entries]
+            )
+            self.cache.commit()
+
     def find_data_in_text(self, text, city):
         """Extract AQI data from text using pattern matching"""
-        try:
-            lines = text.split('\n')
-            line_count = len(lines)
-            
-            # Look for lines containing the city
-            for i, line in enumerate(lines):
-                if city.lower() in line.lower():
-                    # Get current line
-                    city_line = line.strip()
-                    
-                    # Get a few lines after for context (up to 3 lines)
-                    after_lines = []
-                    for j in range(1, 4):
-                        if i + j < line_count:
-                            after_lines.append(lines[i + j].strip())
-                    
-                    # Combine lines for searching
-                    search_text = ' '.join([city_line] + after_lines)
-                    print(f"\nAnalyzing text: {search_text}")
-                    
-                    data = {}
-                    
-                    # Extract Air Quality
-                    for category in self.aqi_colors:
-                        if category in search_text:
-                            data['Air_Quality'] = category
-                            data['Color'] = self.aqi_colors[category]
-                            print(f"Found Air Quality: {category}")
-                            break
-                    
-                    # Extract Index Value (look for 2-3 digit number)
-                    index_matches = re.findall(r'\b(\d{2,3})\b', search_text)
-                    for value in index_matches:
-                        if 50 <= int(value) <= 500:
-                            data['Index_Value'] = value
-                            print(f"Found Index Value: {value}")
-                            break
-
-                    # Extract Pollutants with improved pattern matching
-                    pollutant_text = search_text.replace(' ', '')  # Remove spaces for better matching
-                    pollutants = []
-
-                    # Look for specific pollutant patterns
-                    if 'PM2.5' in pollutant_text:
-                        pollutants.append('PM₂.₅')
-                    if 'PM10' in pollutant_text:
-                        pollutants.append('PM₁₀')
-                    if 'O3' in pollutant_text:
-                        pollutants.append('O₃')
-                    if 'NO2' in pollutant_text:
-                        pollutants.append('NO₂')
-                    if 'SO2' in pollutant_text:
-                        pollutants.append('SO₂')
-                    if 'CO' in pollutant_text:
-                        pollutants.append('CO')
-
-                    # Combine found pollutants
-                    if pollutants:
-                        data['Prominent_Pollutant'] = ', '.join(pollutants)
-                        print(f"Found Pollutants: {data['Prominent_Pollutant']}")
-
-                    if 'Air_Quality' in data and 'Index_Value' in data:
-                        print(f"Found complete data: {data}")
-                        return data
-            
-            return None
-        except Exception as e:
-            print(f"Error extracting data: {e}")
-            return None
+        return _find_data_in_text(text, text.lower(), city.lower(), self.aqi_colors)
 
     def process_pdf(self, pdf_path, city):
         """Process a single PDF file"""
         try:
-            if not pdf_path.exists():
-                print(f"File not found: {pdf_path}")
-                return None
-
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                for page in reader.pages:
-                    text = page.extract_text()
-                    if city.lower() in text.lower():
-                        data = self.find_data_in_text(text, city)
-                        if data:
-                            return data
-            return None
-        except Exception as e:
-            print(f"Error processing PDF: {e}")
+            st = pdf_path.stat()
+        except FileNotFoundError:
+            print(f"File not found: {pdf_path}")
             return None
 
+        hit, data = self.cache_get(pdf_path, city, st)
+        if not hit:
+            found = _process_pdf_multi(pdf_path, [city], self.aqi_colors)
+            if found is None:
+                return None
+            data = found[city]
+            self.cache_put(pdf_path, city, st, data)
+        return data
+
     def process_date_range(self, city, start_date, end_date):
         """Process PDFs for the given date range"""
-        data_list = []
-        current_date = datetime.strptime(start_date, "%Y-%m-%d")
+        return self.process_date_range_multi([city], start_date, end_date)[city]
+
+    def process_date_range_multi(self, cities, start_date, end_date):
+        """Process PDFs for the given date range, reading each PDF once for all cities"""
+        cities = list(dict.fromkeys(cities))
+        data_lists = {city: [] for city in cities}
+        # One directory listing instead of a stat() per date
+        available = {entry.name: entry for entry in os.scandir(self.pdf_dir) if entry.is_file()}
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
         end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+        all_dates = [start_dt + timedelta(days=i) for i in range((end_dt - start_dt).days + 1)]
         
-        while current_date <= end_dt:
+        dates = []
+        results = []
+        misses = []
+        for current_date in all_dates:
             date_str = current_date.strftime("%Y%m%d")
-            pdf_path = self.pdf_dir / f"AQI_Bulletin_{date_str}.pdf"
+            filename = f"AQI_Bulletin_{date_str}.pdf"
+            pdf_path = self.pdf_dir / filename
             
             print(f"\nProcessing date: {current_date.strftime('%Y-%m-%d')}")
             
-            if pdf_path.exists():
-                data = self.process_pdf(pdf_path, city)
-                if data:
-                    data['Date'] = current_date.strftime('%Y-%m-%d')
-                    data_list.append(data)
-                    print(f"Successfully extracted data for {current_date.strftime('%Y-%m-%d')}")
+            if filename in available:
+                st = available[filename].stat()
+                found = {}
+                missing_cities = []
+                for city in cities:
+                    hit, found[city] = self.cache_get(pdf_path, city, st)
+                    if not hit:
+                        missing_cities.append(city)
+                if missing_cities:
+                    misses.append((len(results), pdf_path, st, missing_cities))
+                dates.append(current_date)
+                results.append(found)
             else:
                 print(f"PDF not found: {pdf_path}")
-            
-            current_date += timedelta(days=1)
         
-        return data_list
+        # Text extraction is CPU bound, so spread it across processes; small
+        # batches aren't worth the round trips to the pool
+        paths = [miss[1] for miss in misses]
+        city_lists = [miss[3] for miss in misses]
+        if len(paths) < PARALLEL_MIN_PDFS:
+            extracted = [
+                _process_pdf_multi(pdf_path, missing_cities, self.aqi_colors)
+                for pdf_path, missing_cities in zip(paths, city_lists)
+            ]
+        else:
+            pool = _get_pool()
+            try:
+                extracted = list(pool.map(
+                    partial(_process_pdf_multi, aqi_colors=self.aqi_colors),
+                    paths,
+                    city_lists,
+                    chunksize=4
+                ))
+            except BrokenProcessPool:
+                _discard_pool(pool)
+                raise
+        
+        # Cached in a single transaction rather than one commit per row
+        entries = []
+        for (i, pdf_path, st, missing_cities), found in zip(misses, extracted):
+            if found is None:
+                # Read failures are retried next time rather than cached
+                results[i].update(dict.fromkeys(missing_cities))
+                continue
+            entries.extend((pdf_path, city, st, data) for city, data in found.items())
+            results[i].update(found)
+        if entries:
+            self.cache_put_many(entries)
+        
+        for date, found in zip(dates, results):
+            for city in cities:
+                data = found[city]
+                if data:
+                    data['Date'] = date.strftime('%Y-%m-%d')
+                    data_lists[city].append(data)
+                    print(f"Successfully extracted data for {city} on {date.strftime('%Y-%m-%d')}")
+        
+        return data_lists
 
     def create_excel(self, data_list, city, start_date, end_date):
         """Create Excel file with extracted data"""
@@ -148,63 +421,48 @@ class AQIDataExtractor:
             return False
 
         filename = f"{city}_AQI_{start_date}_to_{end_date}.xlsx"
-        wb = Workbook()
-        ws = wb.active
+        headers = ['Date', 'Air Quality', 'Index Value', 'Prominent Pollutant']
+        rows = [
+            [data['Date'], data['Air_Quality'], data['Index_Value'], data.get('Prominent_Pollutant', '')]
+            for data in data_list
+        ]
+
+        # Write-only workbooks stream rows to disk, so column widths must be
+        # known before the first row is appended
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        for i, header in enumerate(headers):
+            max_length = max(len(str(row[i] or '')) for row in [headers] + rows)
+            ws.column_dimensions[openpyxl.utils.get_column_letter(i + 1)].width = max_length + 2
 
         # Title
         title = f"{city} AQI Information from {start_date} to {end_date}"
-        ws.cell(row=1, column=1, value=title)
-        ws.merge_cells('A1:D1')
-        ws.cell(row=1, column=1).font = Font(bold=True, size=12)
-        ws.cell(row=1, column=1).alignment = Alignment(horizontal='center')
+        title_cell = WriteOnlyCell(ws, value=title)
+        title_cell.font = Font(bold=True, size=12)
+        title_cell.alignment = Alignment(horizontal='center')
+        ws.append([title_cell])
+        ws.merged_cells.add('A1:D1')
 
         # Add blank row
         ws.append([])
 
         # Headers
-        headers = ['Date', 'Air Quality', 'Index Value', 'Prominent Pollutant']
-        ws.append(headers)
-        
-        # Style headers
-        for col in range(1, len(headers) + 1):
-            cell = ws.cell(row=3, column=col)
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
             cell.font = Font(bold=True)
+            header_cells.append(cell)
+        ws.append(header_cells)
 
         # Add data
-        for data in data_list:
-            row = [
-                data['Date'],
-                data['Air_Quality'],
-                data['Index_Value'],
-                data.get('Prominent_Pollutant', '')
-            ]
-            ws.append(row)
-            
+        for data, row in zip(data_list, rows):
             # Color the Air Quality cell
-            last_row = ws.max_row
-            cell = ws.cell(row=last_row, column=2)
+            cell = WriteOnlyCell(ws, value=row[1])
             cell.fill = PatternFill(start_color=data['Color'], 
                                   end_color=data['Color'], 
                                   fill_type='solid')
-            
-            # Set text color based on background
-            rgb = int(data['Color'], 16)
-            brightness = (((rgb >> 16) & 255) * 299 + 
-                        ((rgb >> 8) & 255) * 587 + 
-                        (rgb & 255) * 114) / 1000
-            cell.font = Font(color='000000' if brightness > 128 else 'FFFFFF')
-
-        # Set column widths
-        for column in ws.columns:
-            max_length = 0
-            for cell in column:
-                if cell.row > 1:  # Skip title row
-                    try:
-                        max_length = max(max_length, len(str(cell.value or '')))
-                    except:
-                        pass
-            if max_length > 0:
-                ws.column_dimensions[openpyxl.utils.get_column_letter(cell.column)].width = max_length + 2
+            cell.font = Font(color=self.aqi_font[data['Color']])
+            ws.append([row[0], cell, row[2], row[3]])
 
         try:
             wb.save(filename)
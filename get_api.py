@@ -7,27 +7,46 @@ from complete_aqi_extractor_fixed import AQIDataExtractor
 
 app = Flask(__name__)
 
+# Directories
+PDF_DIR = "aqi_bulletins"
+
+# Shared across requests so connection pools, the missing-date cache and the
+# extraction cache stay warm. The downloader runs on its own event loop; the
+# extractor serializes in-process PDFium calls behind a lock and sends large
+# batches to one forkserver pool per worker, so both can be called from any
+# thread
+downloader = AQIBulletinDownloader(output_dir=PDF_DIR)
+extractor = AQIDataExtractor(PDF_DIR)
+
 @app.route('/api/aqi', methods=['POST'])
 def get_aqi_data():
     """
-    API to fetch AQI data for a city within a date range.
+    API to fetch AQI data for one or more cities within a date range.
     Input:
         - start_date: Start date in YYYY-MM-DD format
         - end_date: End date in YYYY-MM-DD format
-        - city: Name of the city
+        - cities: List of city names (or "city" for a single city)
     Output:
-        - JSON response with dates and AQI data
+        - JSON response with AQI data per city; requests using "city" get
+          the original single-city response
     """
     try:
         # Parse request JSON
         request_data = request.get_json()
         start_date = request_data.get('start_date')
         end_date = request_data.get('end_date')
+        cities = request_data.get('cities')
         city = request_data.get('city')
+        legacy = cities is None
+        if legacy and city:
+            cities = [city]
 
         # Validate input
-        if not start_date or not end_date or not city:
-            return jsonify({'error': 'start_date, end_date, and city are required'}), 400
+        if not start_date or not end_date or not cities:
+            return jsonify({'error': 'start_date, end_date, and cities are required'}), 400
+
+        if not isinstance(cities, list) or not all(isinstance(name, str) and name for name in cities):
+            return jsonify({'error': 'cities must be a list of city names'}), 400
         
         try:
             datetime.strptime(start_date, "%Y-%m-%d")
@@ -35,23 +54,24 @@ def get_aqi_data():
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
 
-        # Directories
-        pdf_dir = "aqi_bulletins"
-        
-        # Step 1: Download AQI PDFs
-        downloader = AQIBulletinDownloader(output_dir=pdf_dir)
+        # Step 1: Download AQI PDFs (shared by every requested city)
         downloader.download_range(start_date, end_date)
 
-        # Step 2: Extract AQI data
-        extractor = AQIDataExtractor(pdf_dir)
-        data = extractor.process_date_range(city, start_date, end_date)
+        # Step 2: Extract AQI data for all cities in one pass over the PDFs
+        data = extractor.process_date_range_multi(cities, start_date, end_date)
+
+        # Requests using the legacy "city" field keep the old response shape
+        if legacy:
+            if not data[city]:
+                return jsonify({'error': f'No data found for {city} in the specified date range'}), 404
+            return jsonify({'city': city, 'start_date': start_date, 'end_date': end_date, 'aqi_data': data[city]}), 200
 
         # Check if data is found
-        if not data:
-            return jsonify({'error': f'No data found for {city} in the specified date range'}), 404
+        if not any(data.values()):
+            return jsonify({'error': f'No data found for {", ".join(cities)} in the specified date range'}), 404
         
         # Return extracted data as JSON
-        return jsonify({'city': city, 'start_date': start_date, 'end_date': end_date, 'aqi_data': data}), 200
+        return jsonify({'cities': list(data), 'start_date': start_date, 'end_date': end_date, 'aqi_data': data}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
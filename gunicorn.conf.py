@@ -0,0 +1,15 @@
+# Gunicorn settings, picked up automatically from the working directory.
+# Each /api/aqi request can spend minutes downloading and parsing bulletins,
+# so run several threaded workers instead of one sync worker.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = 4
+timeout = 600
+
+# Split the CPUs between the workers' PDF extraction pools instead of giving
+# every worker a pool of cpu_count processes
+os.environ.setdefault('AQI_POOL_WORKERS', str(max(1, multiprocessing.cpu_count() // workers)))